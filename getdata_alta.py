@@ -8,28 +8,80 @@
 
 from __future__ import print_function
 import os
+import re
 import sys
+import asyncio
+import glob
 import time
+import socket
+import tarfile
+import shutil
 import logging
+import functools
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-FNULL = open(os.devnull, 'w')
+try:
+    from irods.session import iRODSSession
+    from irods.exception import iRODSException
+except ImportError:
+    iRODSSession = None
+    iRODSException = OSError
+
+ALTA_ARCHIVE = "/altaZone/archive/apertif_main/visibilities_default"
+ALTA_STAGE = "/altaZone/stage/apertif_main/visibilities_default"
+
+# Python 3.12+ warns when extracting without an extraction filter
+TAR_FILTER = {'filter': 'data'} if hasattr(tarfile, 'data_filter') else {}
+
+###################################################################################################
+
+
+@functools.lru_cache(maxsize=None)
+def _irods_session():
+    """Get an iRODS session shared by all transfers, so that authentication is done only once
+
+    Returns:
+        iRODSSession or None: the session, or None if python-irodsclient or the iRODS environment
+            file is not available, or the session cannot be set up (the icommands are used instead).
+            Callers also fall back on the icommands if the session fails to connect or authenticate.
+    """
+    if iRODSSession is None:
+        return None
+    env_file = os.environ.get('IRODS_ENVIRONMENT_FILE',
+                              os.path.expanduser('~/.irods/irods_environment.json'))
+    if not os.path.exists(env_file):
+        return None
+    try:
+        return iRODSSession(irods_env_file=env_file)
+    except Exception as err:
+        logging.getLogger("GET_ALTA").warning("Could not set up iRODS session (%s), using icommands", err)
+        return None
 
 ###################################################################################################
 
 
+_RANGE = re.compile(r'^(\d+)(?:\s*-\s*(\d+))?$')
+
+
 def parse_list(spec):
-    """Convert a string specification like 00-04,07,09-12 into a list [0,1,2,3,4,7,9,10,11,12]
+    """Convert a string specification like 00-04,07,09-12 into a sorted tuple (0,1,2,3,4,7,9,10,11,12)
 
     Args:
         spec (str): string specification
 
     Returns:
-        List[int]
+        Tuple[int]: sorted numbers, without duplicates
 
     Example:
         >>> parse_list("00-04,07,09-12")
-        [0, 1, 2, 3, 4, 7, 9, 10, 11, 12]
+        (0, 1, 2, 3, 4, 7, 9, 10, 11, 12)
+        >>> parse_list("9-10")
+        (9, 10)
+        >>> parse_list("03,03-05")
+        (3, 4, 5)
+        >>> parse_list("00-04, 07")
+        (0, 1, 2, 3, 4, 7)
         >>> parse_list("05-04")
         Traceback (most recent call last):
             ...
@@ -37,23 +89,97 @@ def parse_list(spec):
     """
     ret_list = []
     for spec_part in spec.split(","):
-        if "-" in spec_part:
-            begin, end = spec_part.split("-")
-            if end < begin:
-                raise ValueError(
-                    "In specification %s, end should not be smaller than begin" % spec_part)
-            ret_list += range(int(begin), int(end) + 1)
-        else:
-            ret_list += [int(spec_part)]
+        match = _RANGE.match(spec_part.strip())
+        if match is None:
+            raise ValueError("Invalid specification %s" % spec_part)
+        begin = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) is not None else begin
+        if end < begin:
+            raise ValueError(
+                "In specification %s, end should not be smaller than begin" % spec_part)
+        ret_list.extend(range(begin, end + 1))
+
+    return tuple(sorted(set(ret_list)))
+
+###################################################################################################
+
+
+@functools.lru_cache(maxsize=None)
+def _list_cold_tars(date, task_id):
+    """List the tar files of a task_id that are in the cold storage retrieval location
+
+    Args:
+        date (str): date of the observation
+        task_id (int): task id
+
+    Returns:
+        frozenset[str]: names of the files in the stage collection, empty if there is none
+    """
+    stage_dir = f"{ALTA_STAGE}/{date}{task_id:03d}"
+
+    session = _irods_session()
+    if session is not None:
+        try:
+            if not session.collections.exists(stage_dir):
+                return frozenset()
+            return frozenset(obj.name for obj in session.collections.get(stage_dir).data_objects)
+        except (iRODSException, OSError) as err:
+            logging.getLogger("GET_ALTA").warning("Listing %s over the iRODS session failed (%s), using ils",
+                                                  stage_dir, err)
+
+    cmd = ["ils", stage_dir]
+    try:
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+    except OSError:
+        return frozenset()
+    if result.returncode != 0:
+        return frozenset()
+    # First line is the collection itself, the data objects follow indented
+    return frozenset(line.strip() for line in result.stdout.splitlines()[1:])
+
+###################################################################################################
+
+
+@functools.lru_cache(maxsize=None)
+def get_alta_parent(date, task_id, alta_exception):
+    """Get the collection in ALTA holding all beams of a task_id. Takes care of different historical locations
+
+    Args:
+        date (str): date for which location is requested
+        task_id (int): task id
+        alta_exception (bool): force 3 digits task id, old directory
+
+    Returns:
+        Tuple[str, str]: collection in ALTA, and the name of a beam in it with a {beam_nr} placeholder
+
+    Examples:
+        >>> get_alta_parent(180201, 5, False)
+        ('/altaZone/home/apertif_main/wcudata/WSRTA18020105', 'WSRTA18020105_B{beam_nr:03d}.MS')
+        >>> get_alta_parent(181205, 5, False)
+        ('/altaZone/archive/apertif_main/visibilities_default/181205005', 'WSRTA181205005_B{beam_nr:03d}.MS')
+    """
+    if int(date) < 180216:
+        return (f"/altaZone/home/apertif_main/wcudata/WSRTA{date}{task_id:02d}",
+                f"WSRTA{date}{task_id:02d}_B{{beam_nr:03d}}.MS")
 
-    return ret_list
+    name = f"WSRTA{date}{task_id:03d}_B{{beam_nr:03d}}.MS"
+    if int(date) < 181003 or alta_exception:
+        return f"/altaZone/home/apertif_main/wcudata/WSRTA{date}{task_id:03d}", name
+    elif int(str(date)+'%.3d' % task_id) == 190326001:
+        return f"/altaZone/ingest/apertif_main/visibilities_default/{date}{task_id:03d}", name
+    else:
+        return f"{ALTA_ARCHIVE}/{date}{task_id:03d}", name
 
 ###################################################################################################
 
 
+@functools.lru_cache(maxsize=None)
 def get_alta_dir(date, task_id, beam_nr, alta_exception):
     """Get the directory where stuff is stored in ALTA. Takes care of different historical locations
 
+    Results are cached for the duration of a getdata_alta or getstatus_alta call, and the cold
+    storage location is listed only once per task_id.
+
     Args:
         date (str): date for which location is requested
         task_id (int): task id
@@ -71,25 +197,82 @@ def get_alta_dir(date, task_id, beam_nr, alta_exception):
         >>> get_alta_dir(181205, 5, 35, False)
         '/altaZone/archive/apertif_main/visibilities_default/181205005/WSRTA181205005_B035.MS'
     """
-    #Test if data is in cold storage retrieval location
-    altadir = "/altaZone/stage/apertif_main/visibilities_default/{date}{task_id:03d}/WSRTA{date}{task_id:03d}_B{beam_nr:03d}.MS.tar".format(**locals())
-    cmd = "ils {}".format(altadir)
-    testcold = subprocess.call(cmd.split(), stdout=FNULL, stderr=FNULL)
-    
-    if int(date) < 180216:
-        return "/altaZone/home/apertif_main/wcudata/WSRTA{date}{task_id:02d}/WSRTA{date}{task_id:02d}_B{beam_nr:03d}.MS".format(**locals())
-    elif int(date) < 181003 or alta_exception:
-        return "/altaZone/home/apertif_main/wcudata/WSRTA{date}{task_id:03d}/WSRTA{date}{task_id:03d}_B{beam_nr:03d}.MS".format(**locals())
-    elif int(str(date)+'%.3d' % task_id) == 190326001:
-        return "/altaZone/ingest/apertif_main/visibilities_default/{date}{task_id:03d}/WSRTA{date}{task_id:03d}_B{beam_nr:03d}.MS".format(**locals())
-    elif testcold == 0:
-        return "/altaZone/stage/apertif_main/visibilities_default/{date}{task_id:03d}/WSRTA{date}{task_id:03d}_B{beam_nr:03d}.MS.tar".format(**locals())
-    else:
-        return "/altaZone/archive/apertif_main/visibilities_default/{date}{task_id:03d}/WSRTA{date}{task_id:03d}_B{beam_nr:03d}.MS".format(**locals())
+    parent, name = get_alta_parent(date, task_id, alta_exception)
+    name = name.format(beam_nr=beam_nr)
+
+    #Test if data in the archive is in cold storage retrieval location
+    if parent.startswith(ALTA_ARCHIVE) and name + ".tar" in _list_cold_tars(date, task_id):
+        return f"{ALTA_STAGE}/{date}{task_id:03d}/{name}.tar"
+    return parent + "/" + name
 
 ###################################################################################################
 
 
+def _beam_stem(alta_dir):
+    """Get the name shared by all local files of a beam, e.g. WSRTA181205005_B035
+
+    Args:
+        alta_dir (str): location of the beam in ALTA, as given by get_alta_dir
+
+    Returns:
+        str: name of the measurement set without extension, also for data from cold storage that comes as a tar
+
+    Examples:
+        >>> _beam_stem(get_alta_dir(180201, 5, 1, False))
+        'WSRTA18020105_B001'
+        >>> _beam_stem(ALTA_STAGE + '/191205005/WSRTA191205005_B001.MS.tar')
+        'WSRTA191205005_B001'
+    """
+    name = os.path.basename(alta_dir)
+    for extension in ('.tar', '.MS'):
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+    return name
+
+
+def _verify_log(tmpdir, date, task_id):
+    """Get the irsync verification log of a task_id
+
+    Args:
+        tmpdir (str): directory for temporary files, with trailing slash
+        date (str): date of the observation
+        task_id (int): task id
+
+    Returns:
+        str: path of the log
+    """
+    return f"{tmpdir}transfer_WSRTA{date}{task_id:03d}_to_alta_verify.log"
+
+###################################################################################################
+
+
+def _clear_alta_caches():
+    """Forget cached ALTA locations and close the iRODS session, so that data staged since the
+    last lookup is found and an expired session is not reused"""
+    _list_cold_tars.cache_clear()
+    get_alta_dir.cache_clear()
+    if _irods_session.cache_info().currsize:
+        session = _irods_session()
+        if session is not None:
+            session.cleanup()
+    _irods_session.cache_clear()
+
+
+def _fresh_alta_state(func):
+    """Decorator that clears the ALTA caches and the iRODS session before and after each call"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _clear_alta_caches()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _clear_alta_caches()
+    return wrapper
+
+###################################################################################################
+
+
+@_fresh_alta_state
 def getstatus_alta(date, task_id, beam):
     """
     Funtion to check if the data is on ALTA.
@@ -99,14 +282,236 @@ def getstatus_alta(date, task_id, beam):
     return (bool): True if the file is available, False if not
     """
     altadir = get_alta_dir(date, int(task_id), int(beam), False)
+
+    session = _irods_session()
+    if session is not None:
+        try:
+            if altadir[-3:] == 'tar':
+                return session.data_objects.exists(altadir)
+            return session.collections.exists(altadir)
+        except (iRODSException, OSError) as err:
+            logging.getLogger("GET_ALTA").warning("Checking %s over the iRODS session failed (%s), using ils",
+                                                  altadir, err)
+
     cmd = "ils {}".format(altadir)
-    retcode = subprocess.call(cmd.split(), stdout=FNULL, stderr=FNULL)
+    retcode = subprocess.call(cmd.split(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
     return retcode == 0
 
 ###################################################################################################
 
 
-def getdata_alta(date, task_ids, beams, targetdir=".", tmpdir=".", alta_exception=False, check_with_rsync=True):
+def _extract_and_rename(targetdir, head, stem, fileobj=None):
+    """Untar a measurement set downloaded from cold storage, rename it to the target name and remove the tar file
+
+    Raises RuntimeError if the tar is corrupt or does not contain the expected measurement set.
+
+    Args:
+        targetdir (str): target name of the measurement set, without trailing slash; the tar is {targetdir}.tar
+        head (str): directory containing targetdir
+        stem (str): name of the beam, as given by _beam_stem; the tar contains {stem}.MS
+        fileobj (file-like, optional): stream the tar from this file object instead of
+            reading {targetdir}.tar, in which case there is no tar file to remove
+    """
+    logger = logging.getLogger("GET_ALTA")
+
+    tar_path = f"{targetdir}.tar"
+
+    try:
+        if fileobj is not None:
+            logger.debug("Streaming tar into %s", head)
+            with tarfile.open(fileobj=fileobj, mode='r|') as tf:
+                tf.extractall(path=head, **TAR_FILTER)
+        else:
+            logger.debug("Extracting %s into %s", tar_path, head)
+            with tarfile.open(tar_path) as tf:
+                tf.extractall(path=head, **TAR_FILTER)
+    except tarfile.TarError as err:
+        raise RuntimeError(f"Could not untar {stem}.MS.tar into {head}: {err}") from err
+    untarred = os.path.join(head, f"{stem}.MS")
+    if not os.path.isdir(untarred):
+        raise RuntimeError(f"Untarring {stem}.MS.tar into {head} did not produce {untarred}")
+    #have to rename
+    if untarred != targetdir:
+        logger.debug("Rename untarred file to target name")
+        os.rename(untarred, targetdir)
+    if fileobj is None:
+        #remove tar file
+        logger.debug("Removing tar file")
+        os.unlink(tar_path)
+
+###################################################################################################
+
+
+def _fetch_batch(date, task_id, batch, targetdir, tmpdir):
+    """Download several beams of a single task_id from ALTA with one iget, into targetdir
+
+    Args:
+        date (str): date of the observation
+        task_id (int): task id
+        batch (List[Tuple[int, str]]): beam numbers with their measurement set location in ALTA
+        targetdir (str): directory to put the downloaded files, with trailing slash
+        tmpdir (str): directory for temporary files, with trailing slash
+    """
+    logger = logging.getLogger("GET_ALTA")
+    first, last = batch[0][0], batch[-1][0]
+    logger.debug('Processing task ID %.3d, beams %.3d-%.3d', task_id, first, last)
+
+    # iget only accepts several sources if the target is an existing directory
+    os.makedirs(targetdir, exist_ok=True)
+    stem = f"{_beam_stem(batch[0][1])}-B{last:03d}"
+    cmd = ["iget", "-rfPIT",
+           "-X", f"{tmpdir}{stem}-icat.irods-status",
+           "--lfrestart", f"{tmpdir}{stem}-icat.lf-irods-status",
+           "--retries", "5"] + [alta_dir for beam_nr, alta_dir in batch] + [targetdir]
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(" ".join(cmd))
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+###################################################################################################
+
+
+def _report_extraction(task_id, beam_nr, extraction):
+    """Log the result of a background extraction as soon as it is done, rather than after all downloads
+
+    Args:
+        task_id (int): task id
+        beam_nr (int): beam number
+        extraction (concurrent.futures.Future): the finished extraction
+    """
+    logger = logging.getLogger("GET_ALTA")
+    if extraction.cancelled():
+        logger.warning('Untarring task ID %.3d, beam %.3d was cancelled', task_id, beam_nr)
+    elif extraction.exception() is not None:
+        logger.error('Untarring task ID %.3d, beam %.3d failed: %s', task_id, beam_nr, extraction.exception())
+    else:
+        logger.debug('Untarred task ID %.3d, beam %.3d', task_id, beam_nr)
+
+###################################################################################################
+
+
+def _fetch_one(date, task_id, beam_nr, alta_dir, targetdir, tmpdir, extract_pool, beams_in_targetdir=False):
+    """Download a single beam of a single task_id from ALTA, scheduling untarring if it comes from cold storage
+
+    Args:
+        date (str): date of the observation
+        task_id (int): task id
+        beam_nr (int): beam number
+        alta_dir (str): location of the beam in ALTA, as given by get_alta_dir
+        targetdir (str): directory to put the downloaded files, with trailing slash
+        tmpdir (str): directory for temporary files, with trailing slash
+        extract_pool (concurrent.futures.Executor): pool in which tar files are extracted
+        beams_in_targetdir (bool): put the beam inside targetdir under its own name, instead of
+            using targetdir as the name of the measurement set
+
+    Returns:
+        concurrent.futures.Future or None: the pending extraction if the data came as a tar file
+    """
+    logger = logging.getLogger("GET_ALTA")
+    logger.debug('Processing task ID %.3d, beam %.3d', task_id, beam_nr)
+
+    stem = _beam_stem(alta_dir)
+    status_x = f"{tmpdir}{stem}-icat.irods-status"
+    status_lf = f"{tmpdir}{stem}-icat.lf-irods-status"
+
+    if alta_dir[-2:] == 'MS':
+        cmd = ["iget", "-rfPIT", "-X", status_x, "--lfrestart", status_lf,
+               "--retries", "5", alta_dir, targetdir]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(" ".join(cmd))
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    #check for tar file and untar if needed:
+    elif alta_dir[-3:] == 'tar':
+        if beams_in_targetdir:
+            tar_target = os.path.join(targetdir, f"{stem}.MS")
+        else:
+            tar_target = targetdir.rstrip('/')
+        head, _ = os.path.split(tar_target)
+        session = _irods_session()
+        if session is not None:
+            # The tar is a single data object, so it can be untarred while it is read from
+            # the shared session, without writing the tar to disk first
+            logger.debug("Streaming %s over the iRODS session", alta_dir)
+            try:
+                with session.data_objects.open(alta_dir, 'r') as fileobj:
+                    _extract_and_rename(tar_target, head, stem, fileobj=fileobj)
+                return None
+            except (iRODSException, OSError, RuntimeError) as err:
+                # Streaming has no retries or restart file, so clean up and let iget do it
+                logger.warning("Streaming %s failed (%s), falling back to iget", alta_dir, err)
+                shutil.rmtree(os.path.join(head, f"{stem}.MS"), ignore_errors=True)
+        cmd = ["iget", "-rfPIT", "-X", status_x, "--lfrestart", status_lf,
+               "--retries", "5", alta_dir, f"{tar_target}.tar"]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(" ".join(cmd))
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # Untar in the background, so that this thread can start the next download
+        extraction = extract_pool.submit(_extract_and_rename, tar_target, head, stem)
+        extraction.add_done_callback(functools.partial(_report_extraction, task_id, beam_nr))
+        return extraction
+
+###################################################################################################
+
+
+async def _verify(date, task_id, beam_nr, targetdir, tmpdir, alta_exception, semaphore, beams_in_targetdir=False):
+    """Run irsync on a single downloaded beam of a single task_id, appending the result to the verification log
+
+    Args:
+        date (str): date of the observation
+        task_id (int): task id
+        beam_nr (int): beam number
+        targetdir (str): directory with the downloaded files, with trailing slash
+        tmpdir (str): directory for temporary files, with trailing slash
+        alta_exception (bool): force 3 digits task id, old directory
+        semaphore (asyncio.Semaphore): limits the number of irsync processes running at once
+        beams_in_targetdir (bool): the beam is inside targetdir under its own name, instead of
+            targetdir being the measurement set
+    """
+    logger = logging.getLogger("GET_ALTA")
+
+    # Toggle for when we started using more digits:
+    alta_dir = get_alta_dir(date, task_id, beam_nr, alta_exception)
+    if beams_in_targetdir:
+        local_dir = f"{targetdir}{_beam_stem(alta_dir)}.MS"
+    else:
+        local_dir = targetdir
+    cmd = ["irsync", "-srl", f"i:{alta_dir}", local_dir]
+    logfile = _verify_log(tmpdir, date, task_id)
+
+    async with semaphore:
+        logger.info('Verifying task ID %.3d, beam %.3d...', task_id, beam_nr)
+        with open(logfile, 'ab') as log:
+            proc = await asyncio.create_subprocess_exec(*cmd, stdout=log, stderr=asyncio.subprocess.DEVNULL)
+            await proc.wait()
+
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
+
+
+async def _verify_all(date, task_ids, beams, targetdir, tmpdir, alta_exception, beams_in_targetdir=False,
+                      max_concurrent=8):
+    """Verify all downloaded beams and task_ids with irsync, running up to max_concurrent at once
+
+    Args:
+        date (str): date of the observation
+        task_ids (List[int]): list of task_ids
+        beams (List[int]): list of beam numbers
+        targetdir (str): directory with the downloaded files, with trailing slash
+        tmpdir (str): directory for temporary files, with trailing slash
+        alta_exception (bool): force 3 digits task id, old directory
+        beams_in_targetdir (bool): the beams are inside targetdir under their own name
+        max_concurrent (int): maximum number of irsync processes to run at once
+    """
+    semaphore = asyncio.Semaphore(max_concurrent)
+    await asyncio.gather(*[_verify(date, task_id, beam_nr, targetdir, tmpdir, alta_exception, semaphore,
+                                   beams_in_targetdir)
+                           for task_id in task_ids for beam_nr in beams])
+
+###################################################################################################
+
+
+@_fresh_alta_state
+def getdata_alta(date, task_ids, beams, targetdir=".", tmpdir=".", alta_exception=False, check_with_rsync=True,
+                 max_concurrent_transfers=5, transfer_batch_size=1):
     """Download data from ALTA using low-level IRODS commands.
     Report status to slack
 
@@ -118,11 +523,14 @@ def getdata_alta(date, task_ids, beams, targetdir=".", tmpdir=".", alta_exceptio
         tmpdir (str): directory for temporary files
         alta_exception (bool): force 3 digits task id, old directory
         check_with_rsync (bool): run rsync on the result of iget to verify the data got in
+        max_concurrent_transfers (int): number of transfers to run in parallel
+        transfer_batch_size (int): number of beams of a task_id to fetch with a single iget. Many small
+            measurement sets transfer faster in larger batches. With more than one beam per batch,
+            the beams are put inside targetdir. Beams from cold storage are always fetched one by one.
     """
     # Time the transfer
     start = time.time()
     logger = logging.getLogger("GET_ALTA")
-    logger.setLevel(logging.DEBUG)
 
     if isinstance(task_ids, int):
         task_ids = [task_ids]
@@ -140,81 +548,59 @@ def getdata_alta(date, task_ids, beams, targetdir=".", tmpdir=".", alta_exceptio
         targetdir += "/"
 
     logger.debug('Start getting data from ALTA')
-    logging.debug('Beams: %s' % beams)
 
-    for beam_nr in beams:
-
-        logger.debug('Processing beam %.3d' % beam_nr)
-
-        for task_id in task_ids:
-            logger.debug('Processing task ID %.3d' % task_id)
-
-            alta_dir = get_alta_dir(date, task_id, beam_nr, alta_exception)
-            if alta_dir[-2:] == 'MS':
-                cmd = "iget -rfPIT -X {tmpdir}WSRTA{date}{task_id:03d}_B{beam_nr:03d}-icat.irods-status --lfrestart " \
-                      "{tmpdir}WSRTA{date}{task_id:03d}_B{beam_nr:03d}-icat.lf-irods-status --retries 5 {alta_dir} " \
-                      "{targetdir}".format(**locals())
-                logger.debug(cmd)
-                subprocess.check_call(cmd, shell=True, stdout=FNULL, stderr=FNULL)
-            #check for tar file and untar if needed:
-            elif alta_dir[-3:] == 'tar':
-                targetdir = targetdir[:-1]
-                cmd = "iget -rfPIT -X {tmpdir}WSRTA{date}{task_id:03d}_B{beam_nr:03d}-icat.irods-status --lfrestart " \
-                      "{tmpdir}WSRTA{date}{task_id:03d}_B{beam_nr:03d}-icat.lf-irods-status --retries 5 {alta_dir} " \
-                      "{targetdir}.tar".format(**locals())
-                logger.debug(cmd)
-                subprocess.check_call(cmd, shell=True, stdout=FNULL, stderr=FNULL)
-                head, tail = os.path.split(targetdir)
-                tarcmd = "tar -xf {targetdir}.tar -C {head}".format(**locals())
-                logger.debug(tarcmd)
-                #subprocess.check_call(tarcmd, shell=True, stdout=FNULL, stderr=FNULL)
-                #force untarring
-                os.system(tarcmd)
-                #have to rename
-                head, tail = os.path.split(targetdir)
-                print(head)
-                print(os.path.join(head,'WSRTA{date}{task_id:03d}_B{beam_nr:03d}.MS'.format(**locals())))
-                logger.debug("Rename untarred file to target name")
-                os.rename(os.path.join(head,'WSRTA{date}{task_id:03d}_B{beam_nr:03d}.MS'.format(**locals())),targetdir)
-                #remove tar file
-                logger.debug("Removing tar file")
-                os.remove("{targetdir}.tar".format(**locals()))
-
-
-    os.system('rm -rf {tmpdir}*irods-status'.format(**locals()))
+    # With several beams, or an existing directory as target, every beam goes inside targetdir
+    # under its own name. Otherwise targetdir is the name of the single measurement set.
+    beams_in_targetdir = len(task_ids) * len(beams) > 1 or os.path.isdir(targetdir)
+    if beams_in_targetdir:
+        os.makedirs(targetdir, exist_ok=True)
+
+    # Transfers are network bound and independent, so run several of them at once
+    # and untar in a separate pool so that this overlaps with the next downloads
+    extract_pool = ThreadPoolExecutor(max_workers=max(1, (os.cpu_count() or 1) // 2))
+    jobs = []
+    for task_id in task_ids:
+        # All beams of a task_id share one ALTA collection, only the beam name differs
+        parent, _ = get_alta_parent(date, task_id, alta_exception)
+        logger.debug('Processing task ID %.3d from %s', task_id, parent)
+        alta_dirs = [(beam_nr, get_alta_dir(date, task_id, beam_nr, alta_exception)) for beam_nr in beams]
+        collections = [(beam_nr, alta_dir) for beam_nr, alta_dir in alta_dirs if alta_dir[-2:] == 'MS']
+        if transfer_batch_size > 1 and len(collections) > 1:
+            for i in range(0, len(collections), transfer_batch_size):
+                jobs.append(functools.partial(_fetch_batch, date, task_id, collections[i:i + transfer_batch_size],
+                                              targetdir, tmpdir))
+            alta_dirs = [(beam_nr, alta_dir) for beam_nr, alta_dir in alta_dirs if alta_dir[-2:] != 'MS']
+        for beam_nr, alta_dir in alta_dirs:
+            jobs.append(functools.partial(_fetch_one, date, task_id, beam_nr, alta_dir, targetdir, tmpdir,
+                                          extract_pool, beams_in_targetdir))
+    with extract_pool, ThreadPoolExecutor(max_workers=max_concurrent_transfers) as executor:
+        extractions = [future for future in executor.map(lambda job: job(), jobs) if future is not None]
+        for future in as_completed(extractions):
+            future.result()
+
+    for status_file in glob.glob(os.path.join(tmpdir, '*irods-status')):
+        try:
+            if os.path.isdir(status_file):
+                shutil.rmtree(status_file)
+            else:
+                os.unlink(status_file)
+        except FileNotFoundError:
+            pass
 
     # Add verification at the end of the transfer
     if check_with_rsync:
-        for beam_nr in beams:
-            logger.info('Verifying beam %.3d... ######' % beam_nr)
-
-            for task_id in task_ids:
-                logger.info('Verifying task ID %.3d...' % task_id)
-
-                # Toggle for when we started using more digits:
-                alta_dir = get_alta_dir(date, task_id, beam_nr, alta_exception)
-                if targetdir == '.':
-                    local_dir = "{targetdir}WSRTA{date}{task_id:03d}_B{beam_nr:03d}.MS"
-                else:
-                    local_dir = targetdir
-                cmd = "irsync -srl i:{alta_dir} {local_dir} >> " \
-                      "{tmpdir}transfer_WSRTA{date}{task_id:03d}_to_alta_verify.log".format(
-                          **locals())
-
-                subprocess.check_call(
-                    cmd, shell=True, stdout=FNULL, stderr=FNULL)
+        asyncio.run(_verify_all(date, task_ids, beams, targetdir, tmpdir, alta_exception, beams_in_targetdir))
 
         # Identify server details
-        hostname = os.popen('hostname').read().strip()
+        hostname = socket.gethostname()
 
         # Check for failed files
         for task_id in task_ids:
-            logger.debug('Checking failed files for task ID %.3d' % task_id)
+            logger.debug('Checking failed files for task ID %.3d', task_id)
 
-            cmd = 'grep N {tmpdir}transfer_WSRTA{date}{task_id:03d}_to_alta_verify.log | wc -l'.format(
-                **locals())
-            output = os.popen(cmd)
-            n_failed_files = output.read().split()[0]
+            logfile = _verify_log(tmpdir, date, task_id)
+            with open(logfile, 'rb') as log:
+                n_failed_files = sum(1 for line in log if b'N' in line)
             logger.warning('Number of failed files: %s', n_failed_files)
 
     # Time the transfer
@@ -222,7 +608,7 @@ def getdata_alta(date, task_ids, beams, targetdir=".", tmpdir=".", alta_exceptio
 
     # Print the results
     diff = (end - start) / 60.  # in min
-    logger.debug("Total time to transfer data: %.2f min" % diff)
+    logger.debug("Total time to transfer data: %.2f min", diff)
     logger.debug("Done getting data from ALTA")
 
 ###################################################################################################
@@ -234,6 +620,7 @@ if __name__ == "__main__":
     doctest.testmod()
 
     logging.basicConfig()
+    logging.getLogger("GET_ALTA").setLevel(logging.DEBUG)
 
     args = sys.argv
 